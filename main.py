@@ -1,6 +1,5 @@
 import datetime
-from dataclasses import dataclass, field
-from enum import Enum
+from dataclasses import dataclass, field, fields
 from typing import Optional
 import csv
 import re
@@ -11,6 +10,8 @@ import re
 CURRENCY = "$"
 UNIT = "m"  # k, m, b
 
+OUTPUT_BUFFER_SIZE = 1 << 20  # 1 MiB, so each result file is flushed in one write
+
 DEFAULT_COLUMN_ROW_INDEX = {
     "current_asset": 7,
     "current_liability": 10,
@@ -69,21 +70,32 @@ TXT_SECTION_NAME_TO_COLUMN_NAME = {
     "Cash flows": "cash_flow",
 }
 
-SECTION_WITH_UNIT = [
-    "Revenue",
-    "Profit",
-    "Assets, Liabilities and Equity",
-    "Cash flows",
-]
+SECTION_WITH_UNIT = frozenset(
+    [
+        "Revenue",
+        "Profit",
+        "Assets, Liabilities and Equity",
+        "Cash flows",
+    ]
+)
+
 
+_PCT = "{:.2%}".format
+_FIXED = "{:.2f}".format
+_THOUSANDS = "{:,.2f}".format
 
 FIELD_FORMATTING_FUNCTIONS = {
-    "ratio": lambda x: "{:.2%}".format(x) if x else "",
-    "difference": lambda x: "{:.2f}".format(x) if x else "",
-    "current_year": lambda x: remove_tail_dot_zeros("{:,.2f}".format(x)) if x else "",
-    "last_year": lambda x: remove_tail_dot_zeros("{:,.2f}".format(x)) if x else "",
+    "ratio": lambda x: _PCT(x) if x else "",
+    "difference": lambda x: _FIXED(x) if x else "",
+    "current_year": lambda x: remove_tail_dot_zeros(_THOUSANDS(x)) if x else "",
+    "last_year": lambda x: remove_tail_dot_zeros(_THOUSANDS(x)) if x else "",
 }
 
+_fmt_diff = FIELD_FORMATTING_FUNCTIONS["difference"]
+_fmt_ratio = FIELD_FORMATTING_FUNCTIONS["ratio"]
+_fmt_cy = FIELD_FORMATTING_FUNCTIONS["current_year"]
+_fmt_ly = FIELD_FORMATTING_FUNCTIONS["last_year"]
+
 COMPANY_NAME = "Wokki Company"
 CURRENT_YEAR_NUMBER = 2023
 LAST_YEAR_NUMBER = 2022
@@ -91,11 +103,39 @@ LAST_YEAR_NUMBER = 2022
 tail_dot_rgx = re.compile(r"(?:(\.)|(\.\d*?[1-9]\d*?))0+(?=\b|[^0-9])")
 
 
-def remove_tail_dot_zeros(a):
-    return tail_dot_rgx.sub(r"\2", a)
+_tail_dot_sub = tail_dot_rgx.sub
 
 
-@dataclass
+def remove_tail_dot_zeros(a):
+    if "." not in a:
+        return a
+    head, _, tail = a.rpartition(".")
+    if "." not in head and tail.isascii() and tail.isdecimal():
+        # single formatted number: plain string ops, no regex needed
+        tail = tail.rstrip("0")
+        return f"{head}.{tail}" if tail else head
+    return _tail_dot_sub(r"\2", a)
+
+
+def _parse_amount(value):
+    if isinstance(value, float):
+        return value
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _compute_diff_ratio(current_year, last_year):
+    difference = current_year - last_year
+    if last_year == 0 or current_year < 0 < last_year or last_year < 0 < current_year:
+        return difference, None
+    return difference, difference / last_year
+
+
+@dataclass(slots=True)
 class Row:
     name: str  # first column
     current_year: float  # second column
@@ -104,32 +144,29 @@ class Row:
     ratio: Optional[str] = field(init=False)
 
     def __post_init__(self):
-        try:
-            if not isinstance(self.current_year, float):
-                self.current_year = float(self.current_year)
-            if not isinstance(self.last_year, float):
-                self.last_year = float(self.last_year)
-
-            self.difference = self.current_year - self.last_year
-            self.ratio = self.calculate_ratio(
-                self.difference, self.last_year, self.current_year, self.last_year
+        current_year = _parse_amount(self.current_year)
+        last_year = _parse_amount(self.last_year)
+        if current_year is None or last_year is None:
+            print(
+                f"failed to parse row {(self.name, self.current_year, self.last_year)} "
+                f"because of empty fields"
             )
-        except Exception as e:
-            print(f"failed to parse row {self.__dict__} because of empty fields")
             self.difference = None
             self.ratio = None
-
-    @staticmethod
-    def calculate_ratio(difference, base, current_year, last_year):
-        if current_year * last_year < 0:
-            return None
-        ratio = difference / base
-        return ratio
-
-
-class Year(Enum):
-    CURRENT_YEAR = 1
-    LAST_YEAR = 2
+        else:
+            self.difference, self.ratio = _compute_diff_ratio(current_year, last_year)
+        self.current_year = current_year
+        self.last_year = last_year
+
+    @classmethod
+    def from_floats(cls, name, current_year, last_year):
+        # skips the parsing in __post_init__ for already-numeric values
+        row = cls.__new__(cls)
+        row.name = name
+        row.current_year = current_year
+        row.last_year = last_year
+        row.difference, row.ratio = _compute_diff_ratio(current_year, last_year)
+        return row
 
 
 class Table:
@@ -137,23 +174,16 @@ class Table:
         self.rows: list[Row] = rows or []
         self.current_asset_row_index = 7
         self.current_liability_row = 10
-        self.row_name_index_dict = row_name_index_dict or DEFAULT_COLUMN_ROW_INDEX
+        # per-instance copy: derived row indexes are filled in below
+        self.row_name_index_dict = dict(row_name_index_dict or DEFAULT_COLUMN_ROW_INDEX)
 
     def get_values_from_lambda_tuple(self, lambda_func, *column_names):
-        current_year_res = lambda_func(
-            *[
-                self.get_row_by_name(column_name).current_year
-                for column_name in column_names
-            ]
-        )
-        last_year_res = lambda_func(
-            *[
-                self.get_row_by_name(column_name).last_year
-                for column_name in column_names
-            ]
-        )
+        # resolve each source row once, it may be an earlier derived row
+        rows = [self.get_row_by_name(column_name) for column_name in column_names]
+        current_year_args = [row.current_year for row in rows]
+        last_year_args = [row.last_year for row in rows]
 
-        return current_year_res, last_year_res
+        return lambda_func(*current_year_args), lambda_func(*last_year_args)
 
     def generate_additional_rows(self):
         for column_name, lambda_tuple in ADDITIONAL_ROWS.items():
@@ -161,7 +191,9 @@ class Table:
                 current_year_value, last_year_value = self.get_values_from_lambda_tuple(
                     *lambda_tuple
                 )
-                self.rows.append(Row(column_name, current_year_value, last_year_value))
+                self.rows.append(
+                    Row.from_floats(column_name, current_year_value, last_year_value)
+                )
             except Exception as e:
                 print(f"error while generate_additional_rows {column_name}, e {e}")
                 print("error while lambda_tuple:", lambda_tuple)
@@ -169,11 +201,11 @@ class Table:
 
             # populate the index for report
             if column_name == "Current Ratio":
-                DEFAULT_COLUMN_ROW_INDEX["current_ratio"] = len(self.rows) - 1
+                self.row_name_index_dict["current_ratio"] = len(self.rows) - 1
             elif column_name == "Debt to Equity Ratio":
-                DEFAULT_COLUMN_ROW_INDEX["dte_ratio"] = len(self.rows) - 1
+                self.row_name_index_dict["dte_ratio"] = len(self.rows) - 1
             elif column_name == "Debt Service Coverage Ratio":
-                DEFAULT_COLUMN_ROW_INDEX["dsc_ratio"] = len(self.rows) - 1
+                self.row_name_index_dict["dsc_ratio"] = len(self.rows) - 1
 
     def get_row_by_name(self, row_name: str) -> Row:
         row_index = self.row_name_index_dict[row_name]
@@ -183,66 +215,77 @@ class Table:
         self.rows.append(row)
 
 
-def generate(
-    file,
-    table: Table,
-    structure_dict=TXT_SECTION_NAME_TO_COLUMN_NAME,
-    inner=False,
-    is_unit=False,
-):
+def _flatten_sections(structure_dict, inner=False, is_unit=False):
+    # (prefix, section_name, column_name or None for a heading, need_unit)
+    sections = []
     for index, (section_name, column_name) in enumerate(structure_dict.items()):
         prefix = "" if inner else f"{chr(index + ord('a'))}) "
-        file.write(f"{prefix}{section_name} \n")
         need_unit = is_unit or section_name in SECTION_WITH_UNIT
 
-        if isinstance(column_name, str):
-            current_year_value = table.get_row_by_name(column_name).current_year
-            last_year_value = table.get_row_by_name(column_name).last_year
-            difference = table.get_row_by_name(column_name).difference
-            ratio = table.get_row_by_name(column_name).ratio
-            currency = CURRENCY if need_unit else ""
-            unit = UNIT if need_unit else ""
-            file.write(
-                f"{COMPANY_NAME} has been {'an increase' if difference >= 0 else 'a decrease'} in {section_name.lower()} in "
-                f"{LAST_YEAR_NUMBER} of {currency}{FIELD_FORMATTING_FUNCTIONS['difference'](difference)}{unit}({FIELD_FORMATTING_FUNCTIONS['ratio'](ratio)}) from "
-                f"{currency}{FIELD_FORMATTING_FUNCTIONS['last_year'](last_year_value)}{unit} to {currency}{FIELD_FORMATTING_FUNCTIONS['current_year'](current_year_value)}{unit}. "
-                f"The key factors driving this movement are: \n \n"
+        if isinstance(column_name, dict):
+            sections.append((prefix, section_name, None, need_unit))
+            sections.extend(
+                _flatten_sections(column_name, inner=True, is_unit=need_unit)
             )
-            if ratio > 1:
-                file.write("!!! ratio > 1.0, NEED MORE EXPLANATION")
-        elif isinstance(column_name, dict):
-            generate(file, table, column_name, inner=True, is_unit=need_unit)
+        else:
+            sections.append((prefix, section_name, column_name, need_unit))
+    return sections
+
+
+_FLAT_SECTIONS = tuple(_flatten_sections(TXT_SECTION_NAME_TO_COLUMN_NAME))
+
+
+def generate(file, table: Table, sections=_FLAT_SECTIONS):
+    for prefix, section_name, column_name, need_unit in sections:
+        file.write(f"{prefix}{section_name} \n")
+        if column_name is None:
+            continue
+
+        row = table.get_row_by_name(column_name)
+        current_year_value = row.current_year
+        last_year_value = row.last_year
+        difference = row.difference
+        ratio = row.ratio
+        currency = CURRENCY if need_unit else ""
+        unit = UNIT if need_unit else ""
+        file.write(
+            f"{COMPANY_NAME} has been {'an increase' if difference >= 0 else 'a decrease'} in {section_name.lower()} in "
+            f"{LAST_YEAR_NUMBER} of {currency}{_fmt_diff(difference)}{unit}({_fmt_ratio(ratio)}) from "
+            f"{currency}{_fmt_ly(last_year_value)}{unit} to {currency}{_fmt_cy(current_year_value)}{unit}. "
+            f"The key factors driving this movement are: \n \n"
+        )
+        if ratio is not None and ratio > 1:
+            file.write("!!! ratio > 1.0, NEED MORE EXPLANATION")
 
 
 def analyse_file(input_csv_file_name, delimiter=",", output_csv_file_name=None):
-    table = Table()
     with open(input_csv_file_name, newline="") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            r = Row(*row.values())
-            table.add_row(r)
+        reader = csv.reader(csvfile, delimiter=delimiter)
+        next(reader, None)  # skip header
+        # skip blank lines and pad rows with missing trailing cells
+        table = Table(rows=[Row(*(row + ["", ""])[:3]) for row in reader if row])
 
     table.generate_additional_rows()
 
+    today_str = datetime.date.today().strftime("%m-%d-%y")
     with open(
-        output_csv_file_name
-        or f"result_{datetime.date.today().strftime('%m-%d-%y')}.csv",
+        output_csv_file_name or f"result_{today_str}.csv",
         "w",
         newline="",
+        buffering=OUTPUT_BUFFER_SIZE,
     ) as result_csv:
-        fieldnames = list(r.__dict__.keys())
-        writer = csv.DictWriter(result_csv, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for row in table.rows:
-            row_dict = {
-                k: FIELD_FORMATTING_FUNCTIONS.get(k, lambda x: x)(v)
-                for k, v in row.__dict__.items()
-            }
-            writer.writerow(row_dict)
+        fieldnames = tuple(f.name for f in fields(Row))
+        identity = lambda x: x
+        formatters = [FIELD_FORMATTING_FUNCTIONS.get(k, identity) for k in fieldnames]
+        writer = csv.writer(result_csv)
+        writer.writerow(fieldnames)
+        writer.writerows(
+            [formatter(getattr(row, k)) for k, formatter in zip(fieldnames, formatters)]
+            for row in table.rows
+        )
 
     with open(
-        f"result_{datetime.date.today().strftime('%m-%d-%y')}.txt", "w"
+        f"result_{today_str}.txt", "w", buffering=OUTPUT_BUFFER_SIZE
     ) as result_txt:
         generate(result_txt, table)
 